@@ -1,35 +1,58 @@
 """Pytest configuration and shared fixtures."""
 
+import functools
 import os
-import sys
-from pathlib import Path
-from typing import Any
+from collections.abc import AsyncIterator, Callable, Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, cast
 from unittest.mock import Mock
 
 import pytest
+import pytest_asyncio
 from databricks.sdk import WorkspaceClient
-from dotenv import find_dotenv, load_dotenv
+from dotenv import dotenv_values, find_dotenv
 
-# Add src directory to Python path for imports
-src_path = Path(__file__).parent.parent / "src"
-sys.path.insert(0, str(src_path))
+if TYPE_CHECKING:
+    from langgraph_unity_catalog_checkpoint import AsyncUnityCatalogCheckpointSaver
+
+# The src directory is put on sys.path via pythonpath in pyproject.toml,
+# which pytest applies once at startup; mutating sys.path here would add a
+# duplicate entry per conftest import (e.g. under xdist).
 
-# Load environment variables from .env file
-env_file = find_dotenv()
-if env_file:
-    load_dotenv(env_file)
-    print(f"✓ Loaded environment from {env_file}")
-else:
-    print("ℹ No .env file found")
 
+@functools.lru_cache(maxsize=1)
+def _resolve_env() -> tuple[str, dict[str, str]]:
+    """Locate and parse the .env file once per process.
 
-def has_warehouse_id() -> bool:
-    """Check if Databricks SQL warehouse ID is configured.
+    ``find_dotenv`` walks up the directory tree and ``load_dotenv`` touches
+    ``os.environ`` per line; caching the resolved path and parsed values
+    keeps this to a single pass even when conftest is imported repeatedly
+    (e.g. by xdist workers).
 
     Returns:
-        bool: True if DATABRICKS_SQL_WAREHOUSE_ID environment variable is set.
+        Tuple of the resolved .env path ("" if none) and its parsed values.
     """
-    return bool(os.environ.get("DATABRICKS_SQL_WAREHOUSE_ID"))
+    env_file = find_dotenv()
+    if not env_file:
+        return "", {}
+    parsed = {k: v for k, v in dotenv_values(env_file).items() if v is not None}
+    return env_file, parsed
+
+
+# Load environment variables from .env file
+_env_file, _env_values = _resolve_env()
+os.environ |= {k: v for k, v in _env_values.items() if k not in os.environ}
+if os.environ.get("PYTEST_XDIST_WORKER", "gw0") == "gw0":
+    if _env_file:
+        print(f"✓ Loaded environment from {_env_file}")
+    else:
+        print("ℹ No .env file found")
+
+
+# Captured once after the .env load above; re-reading os.environ per call
+# adds up across large collections (and xdist worker re-imports).
+_HAS_WAREHOUSE_ID: bool = bool(os.environ.get("DATABRICKS_SQL_WAREHOUSE_ID"))
 
 
 def pytest_configure(config: pytest.Config) -> None:
@@ -40,98 +63,242 @@ def pytest_configure(config: pytest.Config) -> None:
     )
 
 
+def pytest_collection_modifyitems(config: pytest.Config, items: list[pytest.Item]) -> None:
+    """Deselect integration tests wholesale when no warehouse is configured.
+
+    Deselection is cheaper than collecting every integration test and then
+    skipping each one individually.
+    """
+    if _HAS_WAREHOUSE_ID:
+        return
+    deselected = [item for item in items if "integration" in item.keywords]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = [item for item in items if "integration" not in item.keywords]
+
+
 # Skip integration tests if warehouse ID is not configured
 skip_if_no_warehouse = pytest.mark.skipif(
-    not has_warehouse_id(),
+    not _HAS_WAREHOUSE_ID,
     reason="DATABRICKS_SQL_WAREHOUSE_ID environment variable not set",
 )
 
 
-@pytest.fixture
-def mock_workspace_client() -> Mock:
-    """Create a mock WorkspaceClient for testing."""
-    client = Mock(spec=WorkspaceClient)
+class _FakeStatementExecution:
+    """Statement-execution surface that the store and checkpointers call.
 
-    # Mock statement execution
-    mock_statement_execution = Mock()
-    mock_result = Mock()
-    mock_result.result = Mock()
-    mock_result.result.data_array = []
+    ``execute_statement`` stays a ``Mock`` so tests keep the familiar
+    ``return_value`` / ``side_effect`` / ``call_args`` API.
+    """
 
-    mock_statement_execution.execute_statement = Mock(return_value=mock_result)
-    client.statement_execution = mock_statement_execution
+    def __init__(self) -> None:
+        """Initialize with a default empty-result execute_statement."""
+        self.execute_statement = Mock(return_value=create_mock_result([]))
 
-    return client
+    def queue(self, *results: "_ExecResult") -> None:
+        """Script the result(s) of upcoming execute_statement calls.
 
+        Args:
+            results: One result to return from every call, or several to
+                return in order, one per call.
+        """
+        if len(results) == 1:
+            self.execute_statement.return_value = results[0]
+        else:
+            self.execute_statement.side_effect = list(results)
 
-@pytest.fixture
+
+class FakeWorkspaceClient:
+    """Targeted fake exposing only the client surface the library uses.
+
+    ``Mock(spec=WorkspaceClient)`` introspects the entire WorkspaceClient
+    class and drags in its lazily-imported service submodules; the library
+    only ever touches ``statement_execution.execute_statement``, so a
+    hand-rolled fake keeps setup to two attribute assignments.
+    """
+
+    def __init__(self) -> None:
+        """Initialize the fake with its statement-execution service."""
+        self.statement_execution = _FakeStatementExecution()
+
+
+@pytest.fixture(scope="session")
+def mock_workspace_client() -> WorkspaceClient:
+    """Create a fake WorkspaceClient shared across the test session.
+
+    The session-scoped fake is reset before each test by
+    ``_reset_mock_workspace_client``.
+    """
+    return cast(WorkspaceClient, FakeWorkspaceClient())
+
+
+@pytest.fixture(autouse=True)
+def _reset_mock_workspace_client(mock_workspace_client: WorkspaceClient) -> None:
+    """Reset the shared fake client before each test so state doesn't leak."""
+    execute = mock_workspace_client.statement_execution.execute_statement
+    execute.reset_mock(return_value=True, side_effect=True)
+    execute.return_value = create_mock_result([])
+
+
+@pytest.fixture(scope="session")
 def warehouse_id() -> str:
     """Test warehouse ID."""
     return "test_warehouse_123"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def catalog() -> str:
     """Test catalog name."""
     return "test_catalog"
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def schema() -> str:
     """Test schema name."""
     return "test_schema"
 
 
-@pytest.fixture
-def store_config(catalog: str, schema: str, warehouse_id: str) -> dict[str, str]:
+@pytest.fixture(scope="session")
+def store_config(catalog: str, schema: str, warehouse_id: str) -> Mapping[str, str]:
     """Configuration for store tests.
 
     Uses PostgreSQL/LangGraph naming convention: "store"
+
+    Returned as a read-only mapping so the session-scoped instance can be
+    shared safely; use ``store_config_factory`` to derive variants.
     """
-    return {
-        "catalog": catalog,
-        "schema": schema,
-        "table": "store",  # PostgreSQL naming convention
-        "warehouse_id": warehouse_id,
-    }
+    return MappingProxyType(
+        {
+            "catalog": catalog,
+            "schema": schema,
+            "table": "store",  # PostgreSQL naming convention
+            "warehouse_id": warehouse_id,
+        }
+    )
 
 
-@pytest.fixture
-def checkpointer_config(catalog: str, schema: str, warehouse_id: str) -> dict[str, str]:
+@pytest.fixture(scope="session")
+def store_config_factory(
+    store_config: Mapping[str, str],
+) -> Callable[..., Mapping[str, str]]:
+    """Build a store config with per-test overrides.
+
+    Returns the shared config untouched when no overrides are given, so
+    the default is never copied.
+    """
+
+    def _factory(**overrides: str) -> Mapping[str, str]:
+        if not overrides:
+            return store_config
+        return dict(store_config) | overrides
+
+    return _factory
+
+
+@pytest.fixture(scope="session")
+def checkpointer_config(catalog: str, schema: str, warehouse_id: str) -> Mapping[str, str]:
     """Configuration for checkpointer tests.
 
     Uses PostgreSQL/LangGraph naming conventions:
     - checkpoints_table: "checkpoints"
     - writes_table: "checkpoint_writes"
+
+    Returned as a read-only mapping so the session-scoped instance can be
+    shared safely; use ``checkpointer_config_factory`` to derive variants.
+    """
+    return MappingProxyType(
+        {
+            "catalog": catalog,
+            "schema": schema,
+            "checkpoints_table": "checkpoints",  # PostgreSQL naming convention
+            "writes_table": "checkpoint_writes",  # PostgreSQL naming convention
+            "warehouse_id": warehouse_id,
+        }
+    )
+
+
+@pytest.fixture(scope="session")
+def checkpointer_config_factory(
+    checkpointer_config: Mapping[str, str],
+) -> Callable[..., Mapping[str, str]]:
+    """Build a checkpointer config with per-test overrides.
+
+    Returns the shared config untouched when no overrides are given, so
+    the default is never copied.
+    """
+
+    def _factory(**overrides: str) -> Mapping[str, str]:
+        if not overrides:
+            return checkpointer_config
+        return dict(checkpointer_config) | overrides
+
+    return _factory
+
+
+@pytest_asyncio.fixture(scope="session")
+async def workspace_client() -> WorkspaceClient:
+    """Create a real WorkspaceClient shared across the test session.
+
+    Session scope means the OAuth/PAT handshake happens once instead of
+    per async test. Only requested by integration tests, so unit runs
+    never attempt authentication.
+    """
+    return WorkspaceClient()
+
+
+@pytest_asyncio.fixture(scope="session")
+async def async_checkpointer(
+    workspace_client: WorkspaceClient,
+) -> AsyncIterator["AsyncUnityCatalogCheckpointSaver"]:
+    """Create a session-scoped async checkpointer against the real warehouse.
+
+    The checkpointer holds no connections of its own beyond the shared
+    ``WorkspaceClient`` HTTP session, so teardown is just letting it go.
+    """
+    # Imported lazily so importing conftest never depends on path setup above.
+    from langgraph_unity_catalog_checkpoint import AsyncUnityCatalogCheckpointSaver
+
+    checkpointer = AsyncUnityCatalogCheckpointSaver(
+        workspace_client=workspace_client,
+        catalog=os.environ.get("DATABRICKS_CATALOG", "main"),
+        schema=os.environ.get("DATABRICKS_SCHEMA", "default"),
+        warehouse_id=os.environ.get("DATABRICKS_SQL_WAREHOUSE_ID", ""),
+    )
+    yield checkpointer
+
+
+@dataclass(slots=True, frozen=True)
+class _ResultBody:
+    """Inner body of a statement-execution result."""
+
+    data_array: list[list[Any]]
+
+
+@dataclass(slots=True, frozen=True)
+class _ExecResult:
+    """Minimal stand-in for a statement-execution response.
+
+    Frozen slotted dataclasses keep each instance to bare attribute
+    storage — far cheaper than ``Mock`` (or even ``SimpleNamespace``)
+    for a helper called on nearly every test.
     """
-    return {
-        "catalog": catalog,
-        "schema": schema,
-        "checkpoints_table": "checkpoints",  # PostgreSQL naming convention
-        "writes_table": "checkpoint_writes",  # PostgreSQL naming convention
-        "warehouse_id": warehouse_id,
-    }
+
+    result: _ResultBody
 
 
-@pytest.fixture
-def mock_execute_result() -> Mock:
+@pytest.fixture(scope="session")
+def mock_execute_result() -> _ExecResult:
     """Create a mock result for statement execution."""
-    result = Mock()
-    result.result = Mock()
-    result.result.data_array = []
-    return result
+    return create_mock_result([])
 
 
-def create_mock_result(data: list[list[Any]]) -> Mock:
+def create_mock_result(data: list[list[Any]]) -> _ExecResult:
     """Helper to create mock result with data.
 
     Args:
         data: List of rows, where each row is a list of column values
 
     Returns:
-        Mock result object
+        Result object exposing ``.result.data_array``
     """
-    result = Mock()
-    result.result = Mock()
-    result.result.data_array = data
-    return result
+    return _ExecResult(result=_ResultBody(data_array=data))